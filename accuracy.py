@@ -8,25 +8,46 @@
 #email: rahmed10@neiu.edu
 #-------------------------------------------------------------------------------------------
 
-from train_model import clean_text
+import pickle
+import numpy as np
+from train_model import clean_text, tag_index
+from evaluation import encode_tags, evaluate
 
 output_path = 'data/model_data/'
 
+#tag index and encoded gold tags of the most recent test set, so that repeated calls with the same test set (e.g. in a
+#hyperparameter sweep) only encode the tagger's output
+gold_cache = {}
+
+def encode_gold(test_tags):
+    """ Function to build the tag index and the encoded gold tags for a test set, reusing the previous result when it is
+        called again with the same test_tags list. The list is assumed not to be modified in place between calls. """
+
+    if gold_cache.get('test_tags') is not test_tags:
+        tags, tag_ids = tag_index({tag for taglist in test_tags for tag in taglist})
+        gold, offsets = encode_tags(test_tags, tag_ids)
+        gold_cache.update({'test_tags': test_tags, 'tags': tags, 'tag_ids': tag_ids, 'gold': gold, 'offsets': offsets})
+
+    return gold_cache['tags'], gold_cache['tag_ids'], gold_cache['gold'], gold_cache['offsets']
+
 def calculate_accuracy(test_tags, model_tags):
     """ Function to calculate the accuracy of the Viterbi algorithm by comparing the output of the POS tagger to the actual tags
-        provided in the test set. """
+        provided in the test set. The tag lists are encoded as integer arrays and compared using the vectorized routines in
+        evaluation.py. Every predicted sentence must have the same length as its gold sentence; a ValueError is raised
+        otherwise. """
+
+    tags, tag_ids, gold, offsets = encode_gold(test_tags)
 
-    num_correct = 0
-    total = 0
+    #predicted tags that never occur in the test set are mapped to the extra id, which never matches a gold tag
+    predicted, predicted_offsets = encode_tags(model_tags, tag_ids)
 
-    for test_taglist, model_taglist in zip(test_tags, model_tags):
-        for test_pos, model_pos in zip(test_taglist, model_taglist):
-            if test_pos == model_pos:
-                num_correct += 1
+    if not np.array_equal(offsets, predicted_offsets):
+        raise ValueError("The tagged sentences do not line up with the test sentences: expected " + str(len(offsets) - 1) +
+                         " sentences of the same lengths as the test set.")
 
-            total += 1
+    results = evaluate(gold, predicted, offsets, len(tags) + 1, with_confusion=False)
 
-    accuracy = round(num_correct/float(total), 3) * 100
+    accuracy = round(results['token_accuracy'], 3) * 100
 
     return accuracy
 
@@ -38,4 +59,4 @@ if __name__ == '__main__':
 
     model_tags = [[wordtag.rsplit('/', 1)[-1] for wordtag in line.strip().split(" ")] for line in tagged_sentences]
 
-    print("The accuracy of the POS model is:" + calculate_accuracy(test_tags, model_tags) + "%")
+    print(f"The accuracy of the POS model is: {calculate_accuracy(test_tags, model_tags)}%")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------------------
+#The purpose of this file is to estimate how well the POS tagger generalizes by k-fold cross-validation, instead of
+#relying on the single fixed split in data/train_corpus.txt and data/test_corpus.txt. The whole corpus is split into
+#k folds; each fold is tagged by a model trained on the remaining k - 1 folds, and the mean and variance of the accuracy
+#and throughput over all folds are reported. Choosing MAX_FREQ_RARE and the deleted interpolation lambda values for a
+#given domain requires many such runs, so the expensive parts are shared between them: the POS ngram counts, word counts
+#and word/tag counts are computed exactly once per fold, and the training counts for a fold are obtained by subtracting
+#that fold's counts from the corpus totals rather than by recounting the other k - 1 folds. The folds are then tagged in
+#parallel processes. The same counts can be reused for every candidate set of hyperparameters. Instead of k folds,
+#a single held-out set (see held_out_split) can be passed in, in which case the model is trained on everything else.
+#
+#Copyright (C) 2021, released under MIT License
+#Author: Raihan Ahmed, Chicago, IL
+#email: rahmed10@neiu.edu
+#-------------------------------------------------------------------------------------------
+
+import math
+import time
+import numpy as np
+from collections import Counter
+from multiprocessing import Pool
+from train_model import clean_text, START_SYMBOL, STOP_SYMBOL
+from emission_probs import morphosyntactic_subcategorize, MAX_FREQ_RARE
+from transmission_probs import transition_probs
+from viterbi import build_decoder, viterbi_decode
+from evaluation import encode_tags, oov_mask, score_counts, summarize
+
+LAMBDAS = [0.125, 0.394, 0.481]
+K_FOLDS = 10
+
+def load_corpus(corpus_files):
+    """ Function to read and clean every file in corpus_files and concatenate them into a single list of token lists and
+        a single list of tag lists. """
+
+    tokenlists = []
+    taglists = []
+
+    for corpus_file in corpus_files:
+        tokens, tags = clean_text(corpus_file)
+        tokenlists.extend(tokens)
+        taglists.extend(tags)
+
+    return tokenlists, taglists
+
+def split_folds(num_sentences, k, seed=0):
+    """ Function to randomly partition the sentence indices 0..num_sentences-1 into k folds of (almost) equal size. It
+        returns a list of k sorted index arrays. """
+
+    order = np.random.default_rng(seed).permutation(num_sentences)
+
+    return [np.sort(fold) for fold in np.array_split(order, k)]
+
+def held_out_split(num_sentences, held_out_fraction=0.2, seed=0):
+    """ Function to randomly split the sentence indices 0..num_sentences-1 into a training set and a held-out set containing
+        roughly held_out_fraction of the sentences. It returns the two sorted index arrays. """
+
+    order = np.random.default_rng(seed).permutation(num_sentences)
+    cut = int(round(num_sentences * (1 - held_out_fraction)))
+
+    return np.sort(order[:cut]), np.sort(order[cut:])
+
+def corpus_counts(tokenlists, taglists):
+    """ Function to collect every count needed to train the tagger from the given sentences: the POS unigram, bigram and
+        trigram counts (padded with start and stop symbols exactly as in train_model.pos_ngram), the word counts and the
+        raw word/tag counts. Runtime complexity: O(n) """
+
+    unigrams = Counter()
+    bigrams = Counter()
+    trigrams = Counter()
+    words = Counter()
+    emissions = Counter()
+
+    for tokenlist, taglist in zip(tokenlists, taglists):
+        padded = [START_SYMBOL, START_SYMBOL] + taglist + [STOP_SYMBOL]
+
+        unigrams.update((tag,) for tag in padded[2:])
+        bigrams.update(zip(padded[1:], padded[2:]))
+        trigrams.update(zip(padded, padded[1:], padded[2:]))
+        words.update(tokenlist)
+        emissions.update(zip(tokenlist, taglist))
+
+    return {'unigrams': unigrams, 'bigrams': bigrams, 'trigrams': trigrams, 'words': words, 'emissions': emissions,
+            'sentences': len(taglists)}
+
+def subtract_counts(totals, counts):
+    """ Function to remove the counts of one fold from the corpus totals, leaving the counts of every other fold. Entries
+        that drop to zero are removed. """
+
+    return {key: totals[key] - counts[key] for key in totals}
+
+def count_folds(tokenlists, taglists, folds):
+    """ Function to count every fold once. It returns the list of per-fold counts along with the corpus totals, which
+        together are enough to train a model for any fold with subtract_counts. The folds need not cover the whole
+        corpus (e.g. a single held-out set); sentences that are in no fold are counted once more and added to the
+        totals, so that they are always part of the training counts. """
+
+    fold_counts = [corpus_counts([tokenlists[i] for i in fold], [taglists[i] for i in fold]) for fold in folds]
+
+    in_folds = np.zeros(len(taglists), dtype=bool)
+    for fold in folds:
+        in_folds[fold] = True
+    rest = np.nonzero(~in_folds)[0]
+
+    totals = {key: Counter() for key in fold_counts[0] if key != 'sentences'}
+    totals['sentences'] = 0
+
+    for counts in fold_counts + [corpus_counts([tokenlists[i] for i in rest], [taglists[i] for i in rest])]:
+        for key in totals:
+            totals[key] += counts[key]
+
+    return fold_counts, totals
+
+def train_from_counts(counts, lambdas, max_freq_rare=MAX_FREQ_RARE, subcategories=None):
+    """ Function to build the components of the tagger from a set of counts (as returned by corpus_counts or
+        subtract_counts). Known words and emission probabilities are computed as in emission_probs.py, and the interpolated
+        transition probabilities as in transmission_probs.py. subcategories is an optional cache mapping each word to its
+        morphosyntactic subcategory, so that the regular expressions are only run once per word for as long as the same
+        cache is passed in (cross_validate keeps one with the counted folds). It returns the pos_set, known_words,
+        q_probs and e_probs. """
+
+    if subcategories is None:
+        subcategories = {}
+
+    known_words = {word for word, count in counts['words'].items() if count >= max_freq_rare}
+
+    #replace rare words by their morphosyntactic subcategory before computing the emission probabilities
+    e_values_c = Counter()
+    for (word, tag), count in counts['emissions'].items():
+        if word not in known_words:
+            if word not in subcategories:
+                subcategories[word] = morphosyntactic_subcategorize(word)
+            word = subcategories[word]
+        e_values_c[(word, tag)] += count
+
+    tag_c = {tag: count for (tag,), count in counts['unigrams'].items() if tag != STOP_SYMBOL}
+    e_probs = {(word, tag): math.log(count, 2) - math.log(tag_c[tag], 2) for (word, tag), count in e_values_c.items()}
+    pos_set = set(tag_c)
+
+    #transition_probs adds the start symbol counts to the dictionaries it's given, so hand it copies. Only the number
+    #of sentences is read from its first argument.
+    q_probs = transition_probs(range(counts['sentences']), dict(counts['unigrams']), dict(counts['bigrams']),
+                               dict(counts['trigrams']), lambdas)
+
+    return pos_set, known_words, q_probs, e_probs
+
+def evaluate_fold(test_sentences, test_tags, pos_set, known_words, q_probs, e_probs):
+    """ Function to tag the sentences of a single fold and score them against their gold tags. It returns the raw counts
+        from evaluation.score_counts along with the time spent tagging. Runs in a worker process. """
+
+    model = build_decoder(pos_set, q_probs, e_probs)
+    num_tags = len(model['tags']) + 1
+
+    start = time.perf_counter()
+    predicted, offsets = viterbi_decode(test_sentences, model)
+    elapsed = time.perf_counter() - start
+
+    gold, _ = encode_tags(test_tags, model['tag_ids'])
+    counts = score_counts(gold, predicted, offsets, num_tags, oov_mask(test_sentences, known_words), with_confusion=False)
+    counts['seconds'] = elapsed
+
+    return counts
+
+def cross_validate(tokenlists, taglists, k=K_FOLDS, lambdas=LAMBDAS, max_freq_rare=MAX_FREQ_RARE, processes=None, seed=0,
+                   folds=None, counted_folds=None):
+    """ Function to run k-fold cross-validation over the given corpus. The folds are tagged in parallel processes (pass
+        processes=1 to tag them in this process). folds is an optional list of sentence index arrays to use as test sets
+        instead of k random folds; for a single held-out evaluation, pass [held_out] from held_out_split, and the model is
+        trained on all other sentences. counted_folds is an optional (folds, fold_counts, totals, subcategories) tuple
+        from a previous call, which lets a hyperparameter sweep skip splitting and counting the corpus again. It returns
+        a dictionary with the per-fold results, the mean and variance of the token, sentence, known-word and OOV
+        accuracies and of the throughput (tokens per second), and the counted folds for reuse. """
+
+    if counted_folds is None:
+        if folds is None:
+            folds = split_folds(len(taglists), k, seed)
+        fold_counts, totals = count_folds(tokenlists, taglists, folds)
+        counted_folds = (folds, fold_counts, totals, {})
+
+    folds, fold_counts, totals, subcategories = counted_folds
+    jobs = []
+
+    for fold, counts in zip(folds, fold_counts):
+        model = train_from_counts(subtract_counts(totals, counts), lambdas, max_freq_rare, subcategories)
+        jobs.append(([tokenlists[i] for i in fold], [taglists[i] for i in fold]) + model)
+
+    if processes == 1:
+        results = [evaluate_fold(*job) for job in jobs]
+    else:
+        with Pool(processes) as pool:
+            results = pool.starmap(evaluate_fold, jobs)
+
+    fold_results = []
+    for counts in results:
+        fold_result = summarize(counts)
+        fold_result['tokens_per_second'] = counts['total'] / counts['seconds'] if counts['seconds'] else 0.0
+        fold_results.append(fold_result)
+
+    summary = {'folds': fold_results, 'counted_folds': counted_folds}
+    for metric in ('token_accuracy', 'sentence_accuracy', 'known_accuracy', 'oov_accuracy', 'tokens_per_second'):
+        values = np.array([fold_result[metric] for fold_result in fold_results])
+        summary[metric] = (float(values.mean()), float(values.var()))
+
+    return summary
+
+if __name__ == '__main__':
+
+    start = time.perf_counter()
+
+    tokenlists, taglists = load_corpus(['data/train_corpus.txt', 'data/test_corpus.txt'])
+
+    summary = cross_validate(tokenlists, taglists)
+
+    #a single held-out evaluation, reusing nothing from the k-fold run
+    _, held_out = held_out_split(len(taglists))
+    held_out_summary = cross_validate(tokenlists, taglists, folds=[held_out])
+
+    for metric in ('token_accuracy', 'sentence_accuracy', 'known_accuracy', 'oov_accuracy'):
+        mean, var = summary[metric]
+        print(f'{metric}: {round(mean * 100, 2)}% (variance {var:.2e})')
+
+    mean, var = summary['tokens_per_second']
+    print(f'tokens_per_second: {round(mean, 1)} (variance {var:.2e})')
+
+    print(f"held-out token_accuracy: {round(held_out_summary['token_accuracy'][0] * 100, 2)}%")
+
+    finish = time.perf_counter()
+    print(f'Finished in {round(finish-start, 2)} second(s)')
@@ -11,6 +11,11 @@
 #predicted with a non-zero probability since unseen words in the test corpus (i.e., words not in the "known words" list)
 #will also be mapped to their morphosyntactic subcategory.
 #
+#For decoding, the emission probabilities are also packed into an emission table: every known word and every
+#morphosyntactic subcategory (e.g. _NUM_, _CAPITAL_) owns one row holding its log emission probability for every tag,
+#with -inf for the tags it was never seen with. A whole sentence can then be looked up at once, instead of probing the
+#(word, tag) dictionary once per candidate tag.
+#
 #
 #Copyright (C) 2021, released under MIT License
 #Author: Raihan Ahmed, Chicago, IL
@@ -21,11 +26,14 @@ import re
 import math
 import time
 import pickle
+import numpy as np
 from collections import defaultdict
+from train_model import tag_index
 
 output_path = 'data/model_data/'
 RARE_SYMBOL = '_RARE_'
 MAX_FREQ_RARE = 5
+SUBCATEGORY_CACHE_SIZE = 100000
 
 #function for retrieving high frequency words from training corpus
 def high_freq(tokenlists):
@@ -94,6 +102,68 @@ def emission_probs(tokenlists, taglists):
 
     return e_probs, tagset
 
+def emission_table(e_probs, pos_set):
+    """ Function to pack the log emission probabilities into a table with one row per word (known words and morphosyntactic
+        subcategories) and one column per tag, in the order given by train_model.tag_index. Tags a word was never seen with
+        get -inf. Words that are neither known nor mapped to a subcategory present in the table fall back to the
+        RARE_SYMBOL row; if RARE_SYMBOL itself is missing, an extra row giving every tag the same (finite) probability is
+        added for that purpose. The non -inf entries of each row are also stored in compressed sparse row form (indptr,
+        indices, data) for decoders that only want to consider the tags a word can actually take. It returns a dictionary
+        holding the table. """
+
+    tags, tag_ids = tag_index(pos_set)
+
+    rows = {}
+    for word, tag in e_probs:
+        if word not in rows:
+            rows[word] = len(rows)
+
+    num_rows = len(rows) + (RARE_SYMBOL not in rows)
+    log_probs = np.full((num_rows, len(tags)), -np.inf, dtype=np.float64)
+
+    for (word, tag), log_prob in e_probs.items():
+        log_probs[rows[word], tag_ids[tag]] = log_prob
+
+    if RARE_SYMBOL in rows:
+        fallback = rows[RARE_SYMBOL]
+    else:
+        fallback = num_rows - 1
+        log_probs[fallback] = -math.log(len(tags), 2)
+
+    finite = np.isfinite(log_probs)
+    indptr = np.zeros(num_rows + 1, dtype=np.intp)
+    np.cumsum(finite.sum(axis=1), out=indptr[1:])
+    indices = np.nonzero(finite)[1].astype(np.intp)
+
+    return {'tags': tags, 'tag_ids': tag_ids, 'rows': rows, 'fallback': fallback, 'log_probs': log_probs,
+            'indptr': indptr, 'indices': indices, 'data': log_probs[finite], 'subcategories': {}}
+
+def emission_rows(table, words):
+    """ Function to find the emission table row of every word in words. Words that are not in the table are mapped to
+        their morphosyntactic subcategory, and to the fallback row if that is missing too. The rows found for such words
+        are memoized in the table; the memo is emptied whenever it reaches SUBCATEGORY_CACHE_SIZE words, so that
+        decoding an unbounded stream of text does not grow it without limit. """
+
+    rows = table['rows']
+    subcategories = table['subcategories']
+
+    def row(word):
+        if word in rows:
+            return rows[word]
+        if word not in subcategories:
+            if len(subcategories) >= SUBCATEGORY_CACHE_SIZE:
+                subcategories.clear()
+            subcategories[word] = rows.get(morphosyntactic_subcategorize(word), table['fallback'])
+        return subcategories[word]
+
+    return np.fromiter((row(word) for word in words), dtype=np.intp, count=len(words))
+
+def emission_lookup(table, words):
+    """ Function to look up the log emission probabilities of a whole sequence of words at once. It returns a matrix with
+        one row per word and one column per tag. """
+
+    return table['log_probs'][emission_rows(table, words)]
+
 if __name__ == '__main__':
 
     start = time.perf_counter()
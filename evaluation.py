@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------------------
+#The purpose of this file is to evaluate the output of the POS tagger quickly enough that it can be called
+#thousands of times during a hyperparameter sweep. Rather than re-parsing "word/tag" strings and counting matches
+#in a Python loop, every tag sequence is encoded once as an integer array (one id per POS tag, with a single extra
+#id reserved for tags that never appeared in the training corpus) and all of the counting is done with vectorized
+#numpy operations. Token accuracy, sentence accuracy, accuracy on known vs. out-of-vocabulary (OOV) words and a
+#per-tag confusion matrix are all computed from the same arrays. Evaluation results are kept as raw counts so that
+#the output of a tagger that was run over several shards of a corpus can be scored separately and merged afterwards.
+#
+#Copyright (C) 2021, released under MIT License
+#Author: Raihan Ahmed, Chicago, IL
+#email: rahmed10@neiu.edu
+#-------------------------------------------------------------------------------------------
+
+import time
+import pickle
+import numpy as np
+from train_model import clean_text, tag_index
+
+output_path = 'data/model_data/'
+
+def encode_tags(taglists, tag_ids):
+    """ Function to flatten a list of POS sequences into a single integer array. Tags that are not in tag_ids are mapped
+        to the extra id len(tag_ids). The first return value is the flat array of tag ids; the second is an array of
+        sentence offsets such that sentence i occupies flat[offsets[i]:offsets[i+1]]. """
+
+    unseen = len(tag_ids)
+
+    lengths = np.fromiter((len(taglist) for taglist in taglists), dtype=np.int64, count=len(taglists))
+    offsets = np.zeros(len(taglists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    flat = np.fromiter((tag_ids.get(tag, unseen) for taglist in taglists for tag in taglist), dtype=np.int32, count=offsets[-1])
+
+    return flat, offsets
+
+def oov_mask(sentences, known_words):
+    """ Function to flag every token of the given sentences that is not a known word (i.e., a word that will be mapped
+        to its morphosyntactic subcategory before tagging). It returns a flat boolean array aligned with encode_tags. """
+
+    num_tokens = sum(len(sentence) for sentence in sentences)
+
+    return np.fromiter((word not in known_words for sentence in sentences for word in sentence), dtype=bool, count=num_tokens)
+
+def score_counts(gold, predicted, offsets, num_tags, oov=None, with_confusion=True):
+    """ Function to compare the predicted tag ids with the gold tag ids. gold and predicted are flat integer arrays as
+        returned by encode_tags, offsets holds the sentence boundaries and num_tags is the number of tag ids in use
+        (normally len(tag_ids) + 1 to leave room for unseen tags). oov is an optional boolean array flagging OOV tokens.
+        It returns a dictionary of raw counts which can be merged with merge_counts and turned into rates with summarize.
+        Runtime complexity: O(n) """
+
+    gold = np.asarray(gold)
+    predicted = np.asarray(predicted)
+
+    if gold.shape != predicted.shape:
+        raise ValueError("The gold and predicted tag arrays must contain the same number of tokens.")
+
+    correct = gold == predicted
+
+    #number of mistakes made before each token; the difference across a sentence's offsets is the number of
+    #mistakes within that sentence
+    errors = np.zeros(correct.size + 1, dtype=np.int64)
+    np.cumsum(~correct, out=errors[1:])
+    sentence_errors = errors[offsets[1:]] - errors[offsets[:-1]]
+
+    counts = {
+        'correct': int(np.count_nonzero(correct)),
+        'total': int(correct.size),
+        'sentences_correct': int(np.count_nonzero(sentence_errors == 0)),
+        'sentences': int(sentence_errors.size),
+        'oov_correct': 0,
+        'oov_total': 0,
+    }
+
+    if oov is not None:
+        counts['oov_correct'] = int(np.count_nonzero(correct & oov))
+        counts['oov_total'] = int(np.count_nonzero(oov))
+
+    if with_confusion:
+        #confusion[i, j] is the number of tokens whose gold tag is i and whose predicted tag is j
+        pairs = gold.astype(np.int64) * num_tags + predicted
+        counts['confusion'] = np.bincount(pairs, minlength=num_tags * num_tags).reshape(num_tags, num_tags)
+
+    return counts
+
+def merge_counts(counts_list):
+    """ Function to add together the counts returned by score_counts for several shards of the same corpus. """
+
+    merged = {}
+
+    for counts in counts_list:
+        for key, value in counts.items():
+            if key in merged:
+                merged[key] = merged[key] + value
+            else:
+                merged[key] = value
+
+    return merged
+
+def summarize(counts):
+    """ Function to turn the counts returned by score_counts (or merge_counts) into accuracies between 0 and 1. Rates
+        whose denominator is zero are reported as 0.0. """
+
+    def rate(num, den):
+        return num / den if den else 0.0
+
+    known_correct = counts['correct'] - counts['oov_correct']
+    known_total = counts['total'] - counts['oov_total']
+
+    results = {
+        'token_accuracy': rate(counts['correct'], counts['total']),
+        'sentence_accuracy': rate(counts['sentences_correct'], counts['sentences']),
+        'known_accuracy': rate(known_correct, known_total),
+        'oov_accuracy': rate(counts['oov_correct'], counts['oov_total']),
+        'tokens': counts['total'],
+        'sentences': counts['sentences'],
+    }
+
+    if 'confusion' in counts:
+        results['confusion'] = counts['confusion']
+
+    return results
+
+def evaluate(gold, predicted, offsets, num_tags, oov=None, with_confusion=True):
+    """ Function to evaluate a single set of predicted tag ids against the gold tag ids. See score_counts and summarize. """
+
+    return summarize(score_counts(gold, predicted, offsets, num_tags, oov, with_confusion))
+
+def score_shards(shards, num_tags, pool=None):
+    """ Function to evaluate a corpus that was tagged in several shards. Each shard is a tuple of (gold, predicted, offsets)
+        or (gold, predicted, offsets, oov) arrays. The counts of every shard are merged, so the result is the same as
+        evaluating the concatenated corpus. The shards are scored one after another in this process by default, which is
+        the fastest choice unless the shards are very large: scoring is vectorized, and starting worker processes costs
+        far more than the scoring itself (about 27x more for 25k tokens in 2 shards). pool is an optional
+        multiprocessing.Pool (or any object with a starmap method) to score the shards in instead; create it once and
+        pass it to every call of a sweep rather than paying for a new one each time. """
+
+    jobs = [tuple(shard[:3]) + (num_tags,) + tuple(shard[3:]) for shard in shards]
+
+    if pool is None:
+        counts_list = [score_counts(*job) for job in jobs]
+    else:
+        counts_list = pool.starmap(score_counts, jobs)
+
+    return summarize(merge_counts(counts_list))
+
+def per_tag_scores(confusion, tags):
+    """ Function to compute the precision, recall and number of gold occurrences of every tag from a confusion matrix. It
+        returns a dictionary mapping each tag to a (precision, recall, support) tuple. The extra row/column for unseen tags,
+        if present, is ignored. """
+
+    confusion = np.asarray(confusion)[:len(tags), :len(tags)]
+
+    hits = np.diagonal(confusion).astype(np.float64)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+
+    precision = np.divide(hits, predicted, out=np.zeros_like(hits), where=predicted > 0)
+    recall = np.divide(hits, support, out=np.zeros_like(hits), where=support > 0)
+
+    return {tag: (float(precision[i]), float(recall[i]), int(support[i])) for i, tag in enumerate(tags)}
+
+if __name__ == '__main__':
+
+    start = time.perf_counter()
+
+    tagged_sentences = pickle.load(open(output_path + "tagged.pickle", "rb" ))
+    known_words = pickle.load(open(output_path + "known_words.pickle", "rb" ))
+    pos_set = pickle.load(open(output_path + "pos_set.pickle", "rb" ))
+
+    test_sentences, test_tags = clean_text('data/test_corpus.txt')
+    model_tags = [[wordtag.rsplit('/', 1)[-1] for wordtag in line.strip().split(" ")] for line in tagged_sentences]
+
+    tags, tag_ids = tag_index(pos_set)
+    gold, offsets = encode_tags(test_tags, tag_ids)
+    predicted, _ = encode_tags(model_tags, tag_ids)
+
+    results = evaluate(gold, predicted, offsets, len(tags) + 1, oov_mask(test_sentences, known_words))
+
+    print(f"Token accuracy:    {round(results['token_accuracy'] * 100, 2)}%")
+    print(f"Sentence accuracy: {round(results['sentence_accuracy'] * 100, 2)}%")
+    print(f"Known accuracy:    {round(results['known_accuracy'] * 100, 2)}%")
+    print(f"OOV accuracy:      {round(results['oov_accuracy'] * 100, 2)}%")
+
+    finish = time.perf_counter()
+    print(f'Finished in {round(finish-start, 2)} second(s)')
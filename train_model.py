@@ -2,9 +2,10 @@
 # # -*- coding: utf-8 -*-
 #-------------------------------------------------------------------------------------------
 #The purpose of this code is to provide the model output that's created when using the Brown training
-#corpus (data/train_corpus.txt) to train a Part of Speech (POS) tagger. The model is written into a
-#text file, which is subsequently saved to the data folder as model_file.txt. The purpose of the text file
-#is to provide an easy visualization of what a Trigram HMM model will look like when first building your own POS tagger.
+#corpus (data/train_corpus.txt) to train a Part of Speech (POS) tagger. When run with the --model-file flag, the model
+#is also written into a text file, which is saved to the data folder as model_file.txt. The purpose of the text file
+#is to provide an easy visualization of what a Trigram HMM model will look like when first building your own POS tagger,
+#and to let models be inspected, diffed and reloaded (see load_model_file) without going through the pickles.
 #Keep in mind that this stage provides a raw (and understandably inaccurate) model without interpolation or dealing
 #with low frequency words, but could still be usable as a first application. Beyond this point, only
 #the unigram, bigram, and trigram dictionaries and the training corpus tokenlists and taglists will
@@ -14,6 +15,12 @@
 #allow us to better generalize the POS tagging trigram HMM model in order to provide more accurate results
 #when predicting POS tags for the test corpus.
 #
+#The model file is a tab separated text file made of sections. Each section starts with a header line holding its
+#name between '@' signs (@unigrams@, @bigrams@, @trigrams@, @emission_counts@), followed by one line per entry: the
+#fields of the entry's key and then its count, all separated by tabs, e.g. "at<TAB>nn<TAB>5126" in @bigrams@ or
+#"The<TAB>at<TAB>412" in @emission_counts@. The file ends with the two lines "@tag_total@<TAB>n" and
+#"@tag_size@<TAB>n". Tokens and tags never contain whitespace, since clean_text splits every line on it.
+#
 #
 #Copyright (C) 2021, released under MIT License
 #Author: Raihan Ahmed, Chicago, IL
@@ -22,12 +29,14 @@
 
 import re
 import os
+import sys
 import time
 import pickle
 
 START_SYMBOL = '*'
 STOP_SYMBOL = 'STOP'
 output_path = 'data/model_data/'
+MODEL_SECTIONS = ['unigrams', 'bigrams', 'trigrams', 'emission_counts']
 
 #get ngrams in tuple form
 def pos_ngram(taglists, n):
@@ -55,11 +64,12 @@ def pos_ngram(taglists, n):
 
     return sorted_tag_sequences
 
-def emission_counts(tokenlists, taglists):
+def emission_counts(tokenlists, taglists, sort=True):
     """ Function to find emission counts for each word and their associated POS tag. It returns a dictionary
         containing the corpus' emission counts for each token/tag pair. This function specifically caters to files
         with the format of the Brown corpus. This function will also be modified for reuse in interpolations.py to
         calculate emission probabilities after taking into account low frequency words that appear in the training corpus.
+        With sort=False the counts are returned as an unsorted dictionary, in the order the pairs first appear.
         Runtime complexity: O(n^2) """
 
     emissions = {}
@@ -71,11 +81,23 @@ def emission_counts(tokenlists, taglists):
             else:
                 emissions.update({(token, tag) : 1})
 
+    if not sort:
+        return emissions
+
     #sort tag_sequences dictionary from greatest count to lowest count
     sortedemissions = sorted(emissions.items(), key=lambda x: x[1], reverse = True)
 
     return sortedemissions
 
+def tag_index(pos_set):
+    """ Function to assign an integer id to every POS tag. It returns a sorted list of the tags (so that tags[i] is the tag
+        with id i) and a dictionary mapping each tag to its id. """
+
+    tags = sorted(pos_set)
+    tag_ids = {tag: i for i, tag in enumerate(tags)}
+
+    return tags, tag_ids
+
 def clean_text(training_corpus):
     """ Function used for cleaning text from data that follows the format of the Brown corpus. Closed
         category words and punctuation are not removed to be able to ensure that training sentences are
@@ -106,46 +128,77 @@ def clean_text(training_corpus):
 
         return tokenlists, taglists
 
-def create_model_file(tokenlists, taglists):
+def write_model_file(model_file, unigrams, bigrams, trigrams, emissions):
+    """ Function for writing a trigram hidden Markov model to a tab separated text file (see the format described at the
+        top of this file). Each of unigrams, bigrams, trigrams and emissions is a dictionary or a list of (key, count)
+        pairs, such as the ones returned by pos_ngram and emission_counts; entries are written in the order given, without
+        sorting them, one section at a time and without building the whole file in memory. """
+
+    def lines(counts):
+        if isinstance(counts, dict):
+            counts = counts.items()
+        for key, value in counts:
+            yield '\t'.join(key) + '\t' + str(value) + '\n'
+
+    if isinstance(unigrams, dict):
+        unigrams = unigrams.items()
+
+    #tag_size is not necessarily the same as vocab size, but tag_total will always
+    #be equal to total words
+    unigrams = list(unigrams)
+    tag_size = len(unigrams)
+    tag_total = sum(value for key, value in unigrams)
+
+    with open(model_file, 'w') as f:
+        for name, counts in zip(MODEL_SECTIONS, (unigrams, bigrams, trigrams, emissions)):
+            f.write('@' + name + '@\n')
+            f.writelines(lines(counts))
+
+        f.write("@tag_total@\t" + str(tag_total) + '\n')
+        f.write("@tag_size@\t" + str(tag_size) + '\n')
+
+def load_model_file(model_file):
+    """ Function for reading a model file written by write_model_file. The whole file is read at once and each line is
+        split on tabs; nothing is evaluated. It returns a dictionary mapping each section name to a dictionary of
+        {key tuple: count}, along with the integers 'tag_total' and 'tag_size'. """
+
+    with open(model_file, 'r') as f:
+        lines = f.read().split('\n')
+
+    model = {}
+    section = None
+
+    for line in lines:
+        if not line:
+            continue
+
+        fields = line.split('\t')
+
+        if len(fields) == 1:
+            section = model[fields[0].strip('@')] = {}
+        elif fields[0] in ('@tag_total@', '@tag_size@'):
+            model[fields[0].strip('@')] = int(fields[1])
+        else:
+            section[tuple(fields[:-1])] = int(fields[-1])
+
+    return model
+
+def create_model_file(tokenlists, taglists, unigrams=None, bigrams=None, trigrams=None):
     """ Function for creating trigram hidden Markov model using POS unigrams, bigrams, trigrams, and
         word/tag pairs with their emission counts. The model is written onto a text file in: data > model_data.
-        The file is for visual and instructional purposes only. It will not be used when creating the POS tagger. """
-
-    tag_size = 0
-    tag_total = 0
-
-    with open('data/model_data/model_file.txt', 'w+') as f:
-        #clear file if contents already exist
-        f.truncate(0)
-
-        f.write('@unigrams@' + '\n')
-        for key, value in pos_ngram(taglists, 1):
-            tag_size += 1
-            tag_total += value
-            string = str(key) + '\t' + str(value)
-            f.write(string + '\n')
-
-        f.write('@bigrams@' + '\n')
-        for key, value in pos_ngram(taglists, 2):
-            string = str(key) + '\t' + str(value)
-            f.write(string + '\n')
-
-        f.write('@trigrams@' + '\n')
-        for key, value in pos_ngram(taglists, 3):
-            string = str(key) + '\t' + str(value)
-            f.write(string + '\n')
-
-        f.write('@emission_counts@' + '\n')
-        for key, value in emission_counts(tokenlists, taglists):
-            string = str(key) + '\t' + str(value)
-            f.write(string + '\n')
-
-        #tag_size is not necessarily the same as vocab size, but tag_total will always
-        #be equal to total words
-        f.write("@tag_total@\t" + str(tag_total) + '\n')
-        f.write("@tag_size@\t" + str(tag_size))
+        The file is for visual and instructional purposes, and can be read back with load_model_file. It will not be
+        used when creating the POS tagger. The ngram counts can be passed in if they have already been computed;
+        the emission counts are streamed in the order they were counted, without sorting them. """
 
-        f.close()
+    if unigrams is None:
+        unigrams = pos_ngram(taglists, 1)
+    if bigrams is None:
+        bigrams = pos_ngram(taglists, 2)
+    if trigrams is None:
+        trigrams = pos_ngram(taglists, 3)
+
+    write_model_file(output_path + 'model_file.txt', unigrams, bigrams, trigrams,
+                     emission_counts(tokenlists, taglists, sort=False))
 
     print("--------------------------------")
     print("Model file successfully created!")
@@ -158,12 +211,14 @@ if __name__ == '__main__':
 
     tokenlists, taglists = clean_text('data/train_corpus.txt')
 
-    create_model_file(tokenlists, taglists)
-
     unigrams = pos_ngram(taglists, 1)
     bigrams = pos_ngram(taglists, 2)
     trigrams = pos_ngram(taglists, 3)
 
+    #the model file is only written on request, reusing the ngram counts computed above
+    if '--model-file' in sys.argv:
+        create_model_file(tokenlists, taglists, unigrams, bigrams, trigrams)
+
     pickle.dump(unigrams, open(output_path + "unigrams.pickle", "wb" ))
     pickle.dump(bigrams, open(output_path + "bigrams.pickle", "wb" ))
     pickle.dump(trigrams, open(output_path + "trigrams.pickle", "wb" ))
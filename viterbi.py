@@ -4,104 +4,249 @@
 #The purpose of this file is to apply the Viterbi algorithm for predicting the POS tags for each
 #sentence in the test corpus.
 #
+#Rather than keeping pi and the backpointers in dictionaries keyed by (k, u, v), the transition
+#probabilities are stored in a dense array indexed by tag ids, and each position k of a sentence only
+#considers the tags that its word was actually seen with in the training corpus (its "candidates"), as
+#given by the emission table in emission_probs.py. For each sentence, the candidate tag ids and their
+#log emission probabilities are first copied into a per-sentence emission slab. The inner step
+#pi[k-1, w, u] + q[w, u, v] + e[word, v] is then computed for all candidate (w, u, v) at once with numpy
+#operations that write into a workspace of arrays allocated once (sized to the longest sentence and the
+#widest candidate list) and reused for every sentence, so decoding creates no per-token arrays. The only
+#per-token memory numpy still uses is the small, bounded iterator buffer of its broadcasting additions.
+#
+#The dense transition array has (K+1)^3 entries for K tags (plus the start symbol), almost all of them LOG_ZERO: with
+#the Brown tag set that is 213^3 entries for about 15k observed trigrams. It is stored as float32 to halve its size, to
+#about 39 MB (scores are still accumulated in float64), but it is rebuilt by every call to build_decoder, and each
+#worker process of cross_validation.py holds one for the fold it is decoding.
+#
 #Copyright (C) 2021, released under MIT License
 #Author: Raihan Ahmed, Chicago, IL
 #email: rahmed10@neiu.edu
 #-------------------------------------------------------------------------------------------
 
-import math
 import time
 import pickle
-from train_model import clean_text
-from collections import defaultdict, deque
-from emission_probs import morphosyntactic_subcategorize
+import itertools
+import numpy as np
+from train_model import clean_text, tag_index
+from emission_probs import emission_table, emission_rows
 
 output_path = 'data/model_data/'
 START_SYMBOL = '*'
 STOP_SYMBOL = 'STOP'
 LOG_ZERO = -1000
 
-#Error with algorithm, seems like pi and bp dictionaries aren't updating with correctly
-def viterbi_algorithm(test_sentences, pos_set, known_words, q_probs, e_probs):
-    """ Applying the Viterbi algorithm with time complexity O(n*k^2) """
+def build_decoder(pos_set, q_probs, e_probs):
+    """ Function to convert the dictionaries produced during training into the arrays used by viterbi_decode. Tag ids
+        0..K-1 are the tags of pos_set in sorted order (see train_model.tag_index) and id K is the start symbol. Transitions
+        that never occurred in the training corpus get the log probability LOG_ZERO. The transition array is dense, with
+        (K+1)^3 float32 entries: about 39 MB for the Brown tag set, so build it once per model and pass the result to
+        every viterbi_decode call rather than rebuilding it. The emissions are held in an emission table (see
+        emission_probs.emission_table), whose sparse rows give each word's candidate tags. It returns a dictionary
+        holding the model arrays. """
 
-    tagged = []
+    tags, tag_ids = tag_index(pos_set)
+    num_states = len(tags) + 1
+    start = len(tags)
 
-    # pi[(k, u, v)]: max probability of a tag sequence ending in tags u, v at position k
-    pi = defaultdict(float)
-    # bp[(k, u, v)]: backpointers to recover the argmax of pi[(k, u, v)]
-    bp = {}
+    #'*' is both the start symbol and a genuine Brown corpus tag, so a '*' in a q_probs key is written to both ids
+    def ids(symbol):
+        result = [tag_ids[symbol]] if symbol in tag_ids else []
+        if symbol == START_SYMBOL:
+            result.append(start)
+        return result
 
-    # Initialization
-    pi[(0, START_SYMBOL, START_SYMBOL)] = 0.0
+    q = np.full((num_states, num_states, num_states), LOG_ZERO, dtype=np.float32)
+    stop = np.full((num_states, num_states), LOG_ZERO, dtype=np.float64)
 
-    # Define tagsets S(k)
-    def S(k):
-        if k in (-1, 0):
-            return {START_SYMBOL}
+    for (a, b, c), log_prob in q_probs.items():
+        if c == STOP_SYMBOL:
+            for i, j in itertools.product(ids(a), ids(b)):
+                stop[i, j] = log_prob
         else:
-            return pos_set
+            for i, j, l in itertools.product(ids(a), ids(b), ids(c)):
+                q[i, j, l] = log_prob
+
+    emissions = emission_table(e_probs, pos_set)
+    width = int(np.diff(emissions['indptr']).max())
+
+    return {'tags': tags, 'tag_ids': tag_ids, 'num_states': num_states, 'start': start, 'q': q.reshape(-1),
+            'stop': stop.reshape(-1), 'emissions': emissions, 'width': width}
+
+def create_workspace(model, max_len):
+    """ Function to preallocate every array needed to decode sentences of up to max_len words with the given model. The
+        returned workspace can be reused for any number of sentences decoded with a model of the same shape (see
+        workspace_fits). Rows of the candidate slab are indexed by k + 1, so that rows 0 and 1 hold the start symbol for
+        positions -1 and 0. """
+
+    width = model['width']
+    num_states = model['num_states']
+
+    ws = {
+        'max_len': max_len,
+        'num_states': num_states,
+        'start': model['start'],
+        'width': width,
+        #candidate tag ids per position, pre-multiplied by the strides of the flattened transition arrays
+        'cand': np.zeros((max_len + 2, width), dtype=np.intp),
+        'cand1': np.zeros((max_len + 2, width), dtype=np.intp),
+        'cand2': np.zeros((max_len + 2, width), dtype=np.intp),
+        'ncand': np.zeros(max_len + 2, dtype=np.intp),
+        #per-sentence emission slab: emis[k, i] is the log emission probability of candidate i of word k
+        'emis': np.zeros((max_len + 1, width), dtype=np.float64),
+        #pi[k, :c*b] viewed as (c, b): max log probability of a tag sequence ending in candidates u, v at positions k-1, k,
+        #stored as [v, u] so that it broadcasts contiguously against the next position's (v, u, w) scores
+        'pi': np.zeros((max_len + 1, width * width), dtype=np.float64),
+        #bp[k, :c*b] viewed as (c, b): backpointer to the candidate at position k-2 that achieves pi[k][v, u]
+        'bp': np.zeros((max_len + 1, width * width), dtype=np.intp),
+        'pair': np.zeros(width * width, dtype=np.intp),
+        'index': np.zeros(width ** 3, dtype=np.intp),
+        #transition log probabilities gathered from q (float32, like q) and the float64 scores built from them
+        'trans': np.zeros(width ** 3, dtype=np.float32),
+        'score': np.zeros(width ** 3, dtype=np.float64),
+        'path': np.zeros(max_len + 1, dtype=np.intp),
+        'rows': np.arange(2, max_len + 2, dtype=np.intp),
+    }
+
+    for row in (0, 1):
+        ws['cand'][row, 0] = model['start']
+        ws['cand1'][row, 0] = model['start'] * num_states
+        ws['cand2'][row, 0] = model['start'] * num_states * num_states
+        ws['ncand'][row] = 1
+
+    return ws
+
+def workspace_fits(ws, model, max_len):
+    """ Function to check whether a workspace can be used to decode sentences of up to max_len words with the given model.
+        The start symbol rows of the workspace depend on the model's number of states, so a workspace built for one model
+        must not be used with a model of a different shape. """
+
+    return (ws['num_states'] == model['num_states'] and ws['start'] == model['start'] and ws['width'] >= model['width']
+            and ws['max_len'] >= max_len)
+
+def decode_sentence(sentence, model, ws, out):
+    """ Function to find the most probable tag sequence for a single sentence. Words that are not in the emission table are
+        mapped to their morphosyntactic subcategory. The tag ids are written into out, which must have room for
+        len(sentence) entries. The workspace must fit the model (see workspace_fits). Runtime complexity: O(n*c^3),
+        where c is the number of candidate tags per word """
 
-    # The Viterbi algorithm
-    for original_sentence in test_sentences:
-        sent_words = [word if word in known_words else morphosyntactic_subcategorize(word) for word in original_sentence]
-        n = len(sent_words)
+    n = len(sentence)
+    if n == 0:
+        return
 
-        # pi = defaultdict(float)
-        # pi[(0, START_SYMBOL, START_SYMBOL)] = 0.0
-        # bp = {}
+    num_states = model['num_states']
+    emissions = model['emissions']
+    indptr, indices, data = emissions['indptr'], emissions['indices'], emissions['data']
+    q = model['q']
+    stop = model['stop']
 
-        for k in range(1, n + 1):
-            # print("word: " + str(k))
-            for u in S(k - 1):
-                for v in S(k):
+    cand, cand1, cand2, ncand = ws['cand'], ws['cand1'], ws['cand2'], ws['ncand']
+    emis, pi, bp = ws['emis'], ws['pi'], ws['bp']
 
-                    max_score = float('-Inf')
-                    max_tag = None
+    #fill the per-sentence emission slab
+    for k, row in enumerate(emission_rows(emissions, sentence), 1):
+        lo, hi = indptr[row], indptr[row + 1]
+        c = hi - lo
+        cand[k + 1, :c] = indices[lo:hi]
+        np.multiply(indices[lo:hi], num_states, out=cand1[k + 1, :c])
+        np.multiply(indices[lo:hi], num_states * num_states, out=cand2[k + 1, :c])
+        emis[k, :c] = data[lo:hi]
+        ncand[k + 1] = c
 
-                    for w in S(k - 2):
-                        if e_probs.get((sent_words[k-1], v), 0) != 0:
-                            score = pi.get((k-1, w, u), LOG_ZERO) + q_probs.get((w, u, v), LOG_ZERO) + e_probs.get((sent_words[k-1], v))
+    pi[0, 0] = 0.0
 
-                            if score < max_score:
-                                max_score = score
-                                max_tag = w
+    #every candidate id is below num_states because the workspace fits the model, so the flat indices are always in
+    #range and mode='clip' (which, unlike mode='raise', does not buffer its output) never actually clips
+    for k in range(1, n + 1):
+        a, b, c = ncand[k - 1], ncand[k], ncand[k + 1]
 
-                                # print(max_score)
-                                # print(max_tag)
+        pair = ws['pair'][:c * b].reshape(c, b)
+        index = ws['index'][:c * b * a].reshape(c, b, a)
+        trans = ws['trans'][:c * b * a].reshape(c, b, a)
+        score = ws['score'][:c * b * a].reshape(c, b, a)
+        pi_k = pi[k, :c * b].reshape(c, b)
 
-                    pi[(k, u, v)] = max_score
-                    bp[(k, u, v)] = max_tag
+        #flat index of q[w, u, v] for every candidate v, u, w; w is the last axis so that the max over w runs along
+        #contiguous memory and writes into contiguous rows of pi and bp, which keeps numpy from copying the score slab
+        np.add(cand[k + 1, :c, None], cand1[k, None, :b], out=pair)
+        np.add(pair[:, :, None], cand2[k - 1, None, None, :a], out=index)
+        np.take(q, index, out=trans, mode='clip')
 
-        max_score = float('-Inf')
-        u_max = None
-        v_max = None
+        np.add(trans, pi[k - 1, :b * a].reshape(b, a), out=score)
+        np.argmax(score, axis=2, out=bp[k, :c * b].reshape(c, b))
+        np.max(score, axis=2, out=pi_k)
+        np.add(pi_k, emis[k, :c, None], out=pi_k)
 
-        # print(pi)
-        # print(bp)
+    a, b = ncand[n], ncand[n + 1]
+    pair = ws['pair'][:b * a].reshape(b, a)
+    final = ws['score'][:b * a].reshape(b, a)
 
-        for u in S(n - 1):
-            for v in S(n):
-                score = pi.get((n, u, v), LOG_ZERO) + q_probs.get((u, v, STOP_SYMBOL), LOG_ZERO)
-                if score > max_score:
-                    max_score = score
-                    u_max = u
-                    v_max = v
+    np.add(cand[n + 1, :b, None], cand1[n, None, :a], out=pair)
+    np.take(stop, pair, out=final, mode='clip')
+    np.add(final, pi[n, :b * a].reshape(b, a), out=final)
 
-        tags = deque()
-        tags.append(v_max)
-        tags.append(u_max)
+    #follow the backpointers; path[k] is the index of the chosen candidate at position k
+    path = ws['path']
+    path[n], path[n - 1] = divmod(int(np.argmax(final)), a)
+    for k in range(n, 2, -1):
+        path[k - 2] = bp[k, path[k] * ncand[k] + path[k - 1]]
 
-        # print(tags)
+    out[:n] = cand[ws['rows'][:n], path[1:n + 1]]
 
-        #This portion of the code errors out; seems like pi and bp dictionaries aren't updating with values correctly
-        for i, k in enumerate(range(n-2, 0, -1)):
-            tags.append(bp[(k+2, tags[i+1], tags[i])])
-        tags.reverse()
+def check_known_words(known_words, model):
+    """ Function to make sure that known_words matches the emission probabilities the model was built from. The decoder
+        itself does not use known_words: a word is treated as known exactly when it has a row of its own in the emission
+        table, and every other word is mapped to its morphosyntactic subcategory. A known word without a row means that
+        known_words and e_probs come from different training runs, so a ValueError is raised. """
+
+    rows = model['emissions']['rows']
+    missing = [word for word in known_words if word not in rows]
+
+    if missing:
+        raise ValueError(str(len(missing)) + " known words (e.g. " + repr(missing[0]) + ") have no emission probabilities; "
+                         "known_words and e_probs do not come from the same model.")
+
+def viterbi_decode(test_sentences, model, ws=None):
+    """ Function to tag every sentence in test_sentences with the model built by build_decoder. A workspace from
+        create_workspace can be passed in to be reused across calls. If it is too small for the longest sentence, or was
+        built for a model of a different shape, it is rebuilt in place, so the caller's workspace stays usable for the
+        next call. It returns the predicted tag ids as a flat array and the sentence offsets, in the same layout as
+        evaluation.encode_tags. """
+
+    lengths = np.fromiter((len(sentence) for sentence in test_sentences), dtype=np.int64, count=len(test_sentences))
+    offsets = np.zeros(len(test_sentences) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    max_len = int(lengths.max()) if len(lengths) else 0
+    if ws is None:
+        ws = create_workspace(model, max_len)
+    elif not workspace_fits(ws, model, max_len):
+        grown = create_workspace(model, max(max_len, ws['max_len']))
+        ws.clear()
+        ws.update(grown)
+
+    predicted = np.zeros(offsets[-1], dtype=np.int32)
+
+    for i, original_sentence in enumerate(test_sentences):
+        decode_sentence(original_sentence, model, ws, predicted[offsets[i]:offsets[i + 1]])
+
+    return predicted, offsets
+
+def viterbi_algorithm(test_sentences, pos_set, known_words, q_probs, e_probs):
+    """ Applying the Viterbi algorithm with time complexity O(n*c^3). It returns each sentence as a string of
+        word/tag pairs. known_words is not used to decode: the words with a row of their own in the emission table
+        built from e_probs are the known words. It is only checked against e_probs (see check_known_words). """
+
+    model = build_decoder(pos_set, q_probs, e_probs)
+    check_known_words(known_words, model)
+    predicted, offsets = viterbi_decode(test_sentences, model)
+
+    tags = model['tags']
+    tagged = []
 
-        tagged_sentence = deque()
-        for j in range(0, n):
-            tagged_sentence.append(original_sentence[j] + '/' + tags[j])
+    for i, original_sentence in enumerate(test_sentences):
+        sent_tags = predicted[offsets[i]:offsets[i + 1]]
+        tagged_sentence = [word + '/' + tags[tag] for word, tag in zip(original_sentence, sent_tags)]
         tagged_sentence.append('\n')
         tagged.append(' '.join(tagged_sentence))
 
@@ -117,16 +262,10 @@ if __name__ == '__main__':
     pos_set = pickle.load(open(output_path + "pos_set.pickle", "rb" ))
 
     test_sentences, tags = clean_text('data/test_corpus.txt')
-    # print(e_probs)
-    # print(pos_set)
-    # print(len(pos_set))
-    # print(q_probs)
-    # print(sorted(q_probs.items(), key=lambda x: x[1]))
 
     tagged_sentences = viterbi_algorithm(test_sentences, pos_set, known_words, q_probs, e_probs)
-    # print(tagged_sentences)
 
-    # tagged_sentences = pickle.dump(tagged, open(output_path + "tagged_sentences.pickle", "wb"))
+    pickle.dump(tagged_sentences, open(output_path + "tagged.pickle", "wb"))
 
     finish = time.perf_counter()
     print(f'Finished in {round(finish-start, 2)} second(s)')